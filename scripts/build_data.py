@@ -17,12 +17,35 @@ Reglas importantes:
 """
 
 import argparse
+import codecs
+import hashlib
+import io
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
 import pandas as pd
 
+try:
+    import pyarrow as pa  # opcional: lectura CSV multihilo y caché Parquet
+    import pyarrow.csv as pacsv
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+try:
+    from orjson import loads as json_loads  # opcional: JSON más rápido
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import polars as pl  # opcional: agregación de stock multihilo
+    HAS_POLARS = True
+except ImportError:
+    HAS_POLARS = False
+
 # ----------- Config -----------
 
 ROOT = Path(__file__).resolve().parents[1]
@@ -34,6 +57,11 @@ IMPORTS = {
     "proveedores": ROOT / "imports" / "lista_proveedores.csv",
 }
 
+# caché Parquet de los imports ya parseados (ver read_csv_cached) y
+# estado del último build (ver build_state)
+CACHE_DIR = ROOT / ".cache"
+STATE_PATH = CACHE_DIR / "build_data.json"
+
 CENTERS = {
     1: ("coll", "Coll"),
     2: ("calvia", "Calvià"),
@@ -41,6 +69,16 @@ CENTERS = {
     4: ("santanyi", "Santanyí"),
 }
 
+# dtype de todo el texto leído (strings Arrow si hay pyarrow: menos memoria
+# y .str.* ejecutado por los kernels de pyarrow.compute)
+TEXT_DTYPE = "string[pyarrow]" if HAS_PYARROW else str
+
+# rango de int32 (stock): lo que quede fuera se recorta, no da la vuelta
+INT32_MIN, INT32_MAX = -2**31, 2**31 - 1
+
+# bytes que se miran para adivinar separador/encoding
+SNIFF_BYTES = 64 * 1024
+
 # mapeos tolerantes de nombres de columnas
 MAP_BASE = {
     "numero":  ["NumeroArticulo","Nº Articulo","NumArticulo","Articulo","CodigoArticulo","Cód. Articulo"],
@@ -57,6 +95,11 @@ MAP_STOCK = {
     "stock":   ["Stock","Existencias","Cantidad","Qty","Unidades"],
 }
 
+# índices {alias en minúsculas: (clave, prioridad)} precalculados; sus claves
+# son también las columnas que se leen de cada CSV (el resto no se materializa)
+ALIAS_BASE = {name.lower(): (key, rank) for key, names in MAP_BASE.items() for rank, name in enumerate(names)}
+ALIAS_STOCK = {name.lower(): (key, rank) for key, names in MAP_STOCK.items() for rank, name in enumerate(names)}
+
 EXPORT_COLUMNS = [
     "NumeroArticulo",
     "ReferenciaProveedor",
@@ -71,77 +114,207 @@ EXPORT_COLUMNS = [
 # ----------- Utils -----------
 
 def log(msg):
-    print(msg, flush=True)
-
-def find_first(df_cols, candidates):
-    """Devuelve el primer nombre de columna existente (case-insensitive)"""
-    cols_lower = {c.lower(): c for c in df_cols}
-    for name in candidates:
-        low = name.lower()
-        if low in cols_lower:
-            return cols_lower[low]
-    return None
-
-def read_csv_smart(path: Path) -> pd.DataFrame:
-    """Lee CSV probando separadores y encodings más comunes."""
-    tries = [
-        {"sep": ";", "encoding": "utf-8-sig"},
-        {"sep": ",", "encoding": "utf-8-sig"},
-        {"sep": ";", "encoding": "latin1"},
-        {"sep": ",", "encoding": "latin1"},
-    ]
+    # una sola escritura por línea: se llama desde varios hilos
+    print(f"{msg}\n", end="", flush=True)
+
+def resolve_columns(df_cols, aliases):
+    """Devuelve {clave: columna real} en una sola pasada (case-insensitive).
+
+    Si varias columnas encajan con la misma clave gana el alias que va antes en MAP_*.
+    """
+    found = {}
+    for c in df_cols:
+        hit = aliases.get(c.lower())
+        if hit is None:
+            continue
+        key, rank = hit
+        if key not in found or rank <= found[key][1]:
+            found[key] = (c, rank)
+    return {key: c for key, (c, _) in found.items()}
+
+def sniff_csv(head: bytes):
+    """Adivina separador y encoding a partir de los primeros KB del fichero."""
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        # exportaciones UTF-16 con BOM: los separadores se cuentan en el texto decodificado
+        enc = "utf-16"
+        head = codecs.getincrementaldecoder(enc)().decode(head, final=False).encode("utf-8")
+    else:
+        try:
+            # incremental: no falla si el corte parte un carácter multibyte
+            codecs.getincrementaldecoder("utf-8-sig")().decode(head, final=False)
+            enc = "utf-8-sig"
+        except UnicodeDecodeError:
+            enc = "latin1"
+    return sniff_sep(head), enc
+
+def sniff_sep(head: bytes, candidates=(";", ",", "\t", "|")):
+    """Separador que aparece el mismo nº de veces en más líneas (como csv.Sniffer).
+
+    Contar el total del bloque falla con comas decimales o texto libre: se
+    puntúa cada candidato por (líneas con su recuento más habitual) × recuento.
+    """
+    lines = [l for l in head.splitlines()[:20] if l.strip()]
+    best, best_score = candidates[0], -1
+    for sep in candidates:
+        counts = [l.count(sep.encode()) for l in lines]
+        if not counts:
+            continue
+        mode = max(set(counts), key=counts.count)
+        score = sum(1 for c in counts if c == mode) * mode
+        if score > best_score:
+            best, best_score = sep, score
+    return best
+
+def read_csv_fast(raw: bytes, usecols, sep: str, encoding: str) -> pd.DataFrame:
+    """Lee `usecols` como texto (solo "" es nulo): pyarrow si está disponible, si no motor C.
+
+    Con pyarrow se fija el tipo string por columna en pyarrow.csv: pd.read_csv(engine="pyarrow")
+    infiere tipos antes de aplicar dtype= y perdería ceros a la izquierda ("0012" -> "12").
+    """
+    if HAS_PYARROW:
+        try:
+            table = pacsv.read_csv(
+                io.BytesIO(raw),
+                read_options=pacsv.ReadOptions(encoding=encoding),
+                parse_options=pacsv.ParseOptions(delimiter=sep, newlines_in_values=True),
+                convert_options=pacsv.ConvertOptions(
+                    include_columns=usecols,
+                    column_types={c: pa.string() for c in usecols},
+                    null_values=[""],
+                    strings_can_be_null=True,
+                ),
+            )
+            return table.to_pandas(types_mapper={pa.string(): pd.api.types.pandas_dtype(TEXT_DTYPE)}.get)
+        except Exception:
+            pass  # seguimos con el lector por defecto
+    return pd.read_csv(io.BytesIO(raw), sep=sep, encoding=encoding, usecols=usecols,
+                       dtype=TEXT_DTYPE, keep_default_na=False, na_values=[""])
+
+def read_csv_smart(path: Path, wanted=None) -> pd.DataFrame:
+    """Lee CSV (todo como texto) probando separadores y encodings más comunes.
+
+    Con `wanted` (nombres en minúsculas) solo se materializan esas columnas.
+    """
+    # el fichero se lee del disco una sola vez; sniff y lecturas usan el buffer
+    raw = path.read_bytes()
+    sep, enc = sniff_csv(raw[:SNIFF_BYTES])
+    tries = [{"sep": sep, "encoding": enc}]
+    tries += [{"sep": s, "encoding": e}
+              for e in ("utf-8-sig", "latin1") for s in (";", ",")
+              if (s, e) != (sep, enc)]
     last_err = None
     for t in tries:
         try:
-            df = pd.read_csv(path, sep=t["sep"], encoding=t["encoding"])
-            if df.empty or len(df.columns) == 1:
+            # solo la cabecera: descarta separadores incorrectos sin leer datos
+            header = pd.read_csv(io.BytesIO(raw), nrows=0, **t).columns
+            if len(header) == 1:
                 # puede ser separador incorrecto, seguimos probando
                 last_err = RuntimeError("posible separador incorrecto")
                 continue
+            usecols = [c for c in header if c.lower() in wanted] if wanted else []
+            df = read_csv_fast(raw, usecols or list(header), **t)
+            if df.empty:
+                last_err = RuntimeError("fichero sin filas")
+                continue
             return df
         except Exception as e:
             last_err = e
     raise RuntimeError(f"No se pudo leer {path.name} como CSV: {last_err}")
 
-def to_numeric(val):
-    """Convierte precios/stock con comas/puntos a número."""
-    if pd.isna(val):
-        return None
-    s = str(val).strip()
-    if s == "":
-        return None
-    # eliminar separadores de miles y normalizar decimal
-    s = s.replace(".", "").replace(",", ".")
+@lru_cache(maxsize=None)
+def cache_salt() -> str:
+    """Parte de la clave de caché que no depende del fichero: este script, versiones y tipo de texto.
+    Así un cambio en el parser o en pandas/pyarrow invalida los Parquet ya guardados."""
+    script = file_hash(Path(__file__).resolve()).hex()
+    return f"{script}:{pd.__version__}:{pa.__version__}:{TEXT_DTYPE}"
+
+def read_csv_cached(path: Path, wanted=None, use_cache: bool = True) -> pd.DataFrame:
+    """read_csv_smart con caché Parquet en .cache/ (clave: ruta, mtime, tamaño, columnas y cache_salt)."""
+    if not HAS_PYARROW or not use_cache:
+        return read_csv_smart(path, wanted)
+    st = path.stat()
+    key = f"{path}:{st.st_mtime_ns}:{st.st_size}:{sorted(wanted or [])}:{cache_salt()}"
+    cache = CACHE_DIR / f"{path.stem}-{hashlib.sha1(key.encode()).hexdigest()}.parquet"
+    if cache.exists():
+        try:
+            return pd.read_parquet(cache)
+        except Exception:
+            pass  # caché ilegible: se regenera
+    df = read_csv_smart(path, wanted)
     try:
-        return float(s)
-    except Exception:
-        return None
+        ensure_dir(CACHE_DIR)
+        for old in CACHE_DIR.glob(f"{path.stem}-*.parquet"):
+            old.unlink()
+        df.to_parquet(cache, index=False)
+    except Exception as e:
+        log(f"⚠️  No se pudo guardar la caché de {path.name}: {e}")
+    return df
+
+def norm_num(s: pd.Series) -> pd.Series:
+    """NumeroArticulo como texto sin espacios; se normaliza una sola vez por fichero."""
+    return s.astype(TEXT_DTYPE).str.strip()
+
+def to_numeric(s: pd.Series) -> pd.Series:
+    """Convierte precios/stock con comas/puntos a número (NaN si no se puede)."""
+    s = s.astype(TEXT_DTYPE).str.strip()
+    # eliminar separadores de miles y normalizar decimal
+    s = s.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    return pd.to_numeric(s, errors="coerce").astype("float64")
+
+def file_hash(path: Path) -> bytes:
+    """blake2b del fichero leído por bloques de 1 MiB (sin cargarlo entero)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+def replace_if_changed(tmp_path: Path, path: Path) -> bool:
+    """Mueve tmp_path a path si el contenido difiere; devuelve si hubo cambio."""
+    if path.exists() and path.stat().st_size == tmp_path.stat().st_size \
+            and file_hash(path) == file_hash(tmp_path):
+        tmp_path.unlink()
+        return False
+    os.replace(tmp_path, path)
+    return True
+
+def to_int32(s: pd.Series) -> pd.Series:
+    """Redondea y pasa a int32 recortando al rango: astype solo daría la vuelta (3e9 -> negativo)."""
+    return s.round().clip(INT32_MIN, INT32_MAX).astype("int32")
 
 def ensure_dir(p: Path):
     p.mkdir(parents=True, exist_ok=True)
 
+@lru_cache(maxsize=32)
+def cached_json(path_str: str, mtime_ns: int, size: int):
+    """JSON parseado, cacheado por (ruta, mtime, tamaño): si el fichero cambia, se relee."""
+    return json_loads(Path(path_str).read_bytes())
+
 def load_json_if_exists(path: Path):
+    """Devuelve el JSON (solo lectura: el dict puede estar compartido por la caché)."""
     if path.exists():
         try:
-            return json.loads(path.read_text(encoding="utf-8"))
+            st = path.stat()
+            return cached_json(str(path), st.st_mtime_ns, st.st_size)
         except Exception:
             log(f"⚠️  No se pudo leer JSON: {path}")
     return {}
 
 # ----------- Carga base y stock -----------
 
-def load_base_precios(path: Path, verbose: bool) -> pd.DataFrame:
+def load_base_precios(path: Path, verbose: bool, use_cache: bool = True) -> pd.DataFrame:
     if verbose:
         log(f"→ Leyendo base artículos: {path}")
-    df = read_csv_smart(path)
+    df = read_csv_cached(path, wanted=ALIAS_BASE, use_cache=use_cache)
 
     # localizar columnas
-    col_num   = find_first(df.columns, MAP_BASE["numero"])
-    col_ref   = find_first(df.columns, MAP_BASE["refprov"])
-    col_desc  = find_first(df.columns, MAP_BASE["descr"])
-    col_prec  = find_first(df.columns, MAP_BASE["precio"])
-    col_ean   = find_first(df.columns, MAP_BASE["ean"]) or "CodigoEAN"
-    col_prov  = find_first(df.columns, MAP_BASE["prov"]) or "NombreProveedor"
+    cols = resolve_columns(df.columns, ALIAS_BASE)
+    col_num   = cols.get("numero")
+    col_ref   = cols.get("refprov")
+    col_desc  = cols.get("descr")
+    col_prec  = cols.get("precio")
+    col_ean   = cols.get("ean") or "CodigoEAN"
+    col_prov  = cols.get("prov") or "NombreProveedor"
 
     missing = [("NumeroArticulo", col_num), ("ReferenciaProveedor", col_ref), ("Descripcion", col_desc), ("Precio", col_prec)]
     missing_names = [exp for exp, real in missing if real is None]
@@ -149,20 +322,20 @@ def load_base_precios(path: Path, verbose: bool) -> pd.DataFrame:
         raise RuntimeError(f"En {path.name} faltan columnas clave: {missing_names}")
 
     out = pd.DataFrame()
-    out["NumeroArticulo"] = df[col_num].astype(str).str.strip()
-    out["ReferenciaProveedor"] = df[col_ref].astype(str).str.strip()
-    out["Descripcion"] = df[col_desc].astype(str).str.strip()
+    out["NumeroArticulo"] = norm_num(df[col_num])
+    out["ReferenciaProveedor"] = df[col_ref].str.strip()
+    out["Descripcion"] = df[col_desc].str.strip()
 
-    precios = df[col_prec].apply(to_numeric)
+    precios = to_numeric(df[col_prec])
     out["Precio"] = precios.fillna(0.0).round(2)
 
     if col_ean in df.columns:
-        out["CodigoEAN"] = df[col_ean].astype(str).str.strip()
+        out["CodigoEAN"] = df[col_ean].str.strip()
     else:
         out["CodigoEAN"] = ""
 
     if col_prov in df.columns:
-        out["NombreProveedor"] = df[col_prov].astype(str).str.strip()
+        out["NombreProveedor"] = df[col_prov].str.strip()
     else:
         out["NombreProveedor"] = ""
 
@@ -171,33 +344,66 @@ def load_base_precios(path: Path, verbose: bool) -> pd.DataFrame:
         log(f"   · Artículos base: {len(out):,}")
     return out
 
-def load_stock(path: Path, verbose: bool) -> pd.DataFrame:
+def pivot_stock_polars(tmp: pd.DataFrame) -> pd.DataFrame:
+    """groupby+pivot de stock en Polars (multihilo); mismo formato que el pivot de pandas."""
+    pivot = (
+        pl.from_pandas(tmp)
+        .group_by(["NumeroArticulo", "Codigo_almacen"])
+        .agg(pl.col("Stock").sum())
+        .pivot(on="Codigo_almacen", index="NumeroArticulo", values="Stock")
+        .to_pandas()
+        .set_index("NumeroArticulo")
+        .fillna(0.0)
+    )
+    # Polars nombra las columnas del pivot como texto ("1", "2", ...)
+    pivot.columns = [int(c) for c in pivot.columns]
+    return pivot
+
+def load_stock(path: Path, verbose: bool, use_cache: bool = True) -> pd.DataFrame:
     if verbose:
         log(f"→ Leyendo stock por almacén: {path}")
-    df = read_csv_smart(path)
+    df = read_csv_cached(path, wanted=ALIAS_STOCK, use_cache=use_cache)
 
-    col_num   = find_first(df.columns, MAP_STOCK["numero"])
-    col_alm   = find_first(df.columns, MAP_STOCK["almacen"])
-    col_stock = find_first(df.columns, MAP_STOCK["stock"])
+    cols = resolve_columns(df.columns, ALIAS_STOCK)
+    col_num   = cols.get("numero")
+    col_alm   = cols.get("almacen")
+    col_stock = cols.get("stock")
 
     missing = [("NumeroArticulo", col_num), ("Codigo_almacen", col_alm), ("Stock", col_stock)]
     missing_names = [exp for exp, real in missing if real is None]
     if missing_names:
         raise RuntimeError(f"En {path.name} faltan columnas: {missing_names}")
 
-    tmp = pd.DataFrame()
-    tmp["NumeroArticulo"] = df[col_num].astype(str).str.strip()
-    tmp["Codigo_almacen"] = pd.to_numeric(df[col_alm], errors="coerce").astype("Int64")
-    tmp["Stock"] = df[col_stock].apply(to_numeric).fillna(0)
-
-    # quedarnos solo con almacenes 1..4
-    tmp = tmp[tmp["Codigo_almacen"].isin(CENTERS.keys())].copy()
-
-    # agrupar por articulo y almacén
-    g = tmp.groupby(["NumeroArticulo", "Codigo_almacen"], as_index=False)["Stock"].sum()
-
-    # pivot a columnas por centro
-    pivot = g.pivot(index="NumeroArticulo", columns="Codigo_almacen", values="Stock").fillna(0.0)
+    # quedarnos solo con almacenes 1..4: se filtra con una máscara antes de
+    # limpiar el resto de columnas (menos filas que parsear, sin .copy())
+    alm = pd.to_numeric(df[col_alm], errors="coerce").astype("Int64")
+    mask = alm.isin(CENTERS.keys()).to_numpy(dtype=bool)
+    tmp = pd.DataFrame({
+        "NumeroArticulo": norm_num(df.loc[mask, col_num]),
+        "Codigo_almacen": alm[mask],
+        "Stock": to_numeric(df.loc[mask, col_stock]).fillna(0),
+    })
+    # fuera filas sin NumeroArticulo: Polars agruparía los nulos y el merge los
+    # uniría a artículos base sin número (pandas ya los descartaba)
+    tmp = tmp[tmp["NumeroArticulo"].fillna("") != ""]
+
+    # agrupar por articulo y almacén + pivot a columnas por centro
+    if HAS_POLARS:
+        pivot = pivot_stock_polars(tmp)
+    else:
+        # solo hay 4 almacenes: una agregación por almacén sale más barata que
+        # un pivot genérico (clave categórica: se agrupa por códigos enteros)
+        tmp["NumeroArticulo"] = tmp["NumeroArticulo"].astype("category")
+        pieces = [
+            tmp.loc[tmp["Codigo_almacen"] == cod]
+            .groupby("NumeroArticulo", observed=True, sort=False)["Stock"].sum()
+            .rename(cod)
+            for cod in CENTERS
+        ]
+        pivot = pd.concat(pieces, axis=1).fillna(0.0)
+
+    # un almacén sin filas falta en el pivot de Polars: mismas columnas en ambos caminos
+    pivot = pivot.reindex(columns=list(CENTERS), fill_value=0.0)
 
     # nombres finales de columnas
     rename_cols = {}
@@ -206,87 +412,128 @@ def load_stock(path: Path, verbose: bool) -> pd.DataFrame:
             rename_cols[cod] = f"stock_{key}"
     pivot = pivot.rename(columns=rename_cols)
 
-    # redondear y a int
+    # redondear y a int32 (de sobra para stock; la mitad de bytes que int64)
     for cod, (key, _) in CENTERS.items():
         col = f"stock_{key}"
         if col in pivot.columns:
-            pivot[col] = pivot[col].round().astype(int)
+            pivot[col] = to_int32(pivot[col])
 
     pivot = pivot.reset_index()
+    pivot["NumeroArticulo"] = pivot["NumeroArticulo"].astype(TEXT_DTYPE)
     if verbose:
         log(f"   · Registros de stock (tras pivot): {len(pivot):,}")
     return pivot
 
 # ----------- Build -----------
 
+def override_paths(center_key: str):
+    """Rutas (EAN, imágenes) de los overrides de un centro."""
+    return (
+        ROOT / "overrides" / "ean" / f"{center_key}.json",
+        ROOT / "overrides" / "images" / f"{center_key}.json",
+    )
+
 def apply_overrides_per_center(df_out: pd.DataFrame, center_key: str):
     """Aplica overrides de EAN e imagen para un centro concreto."""
-    ean_path = ROOT / "overrides" / "ean" / f"{center_key}.json"
-    img_path = ROOT / "overrides" / "images" / f"{center_key}.json"
+    ean_path, img_path = override_paths(center_key)
 
     eans = load_json_if_exists(ean_path)     # {NumeroArticulo: EAN}
     imgs = load_json_if_exists(img_path)     # {NumeroArticulo: URL}
 
+    # valores como texto: un EAN numérico en el JSON (8410000000001) no debe salir como float
+    eans = {k: str(v) for k, v in eans.items() if v is not None}
+    imgs = {k: str(v) for k, v in imgs.items() if v is not None}
+
+    keys = df_out["NumeroArticulo"]  # ya normalizado (norm_num)
+
     if eans:
         # Solo aplicar si hay valor (no sobreescribir con vacío)
-        df_out["CodigoEAN"] = df_out.apply(
-            lambda r: eans.get(str(r["NumeroArticulo"]), r["CodigoEAN"]) or r["CodigoEAN"], axis=1
-        )
+        mapped = keys.map(eans)
+        df_out["CodigoEAN"] = mapped.where(mapped.notna() & (mapped != ""), df_out["CodigoEAN"])
     if imgs:
-        df_out["ImagenURL"] = df_out.apply(
-            lambda r: imgs.get(str(r["NumeroArticulo"]), r["ImagenURL"]) or r["ImagenURL"], axis=1
-        )
+        mapped = keys.map(imgs)
+        df_out["ImagenURL"] = mapped.where(mapped.notna() & (mapped != ""), df_out["ImagenURL"])
     return df_out
 
-def build(verbose: bool = False):
-    base = load_base_precios(IMPORTS["base_precios"], verbose=verbose)
-    stock = load_stock(IMPORTS["stock"], verbose=verbose)
+def export_center(master: pd.DataFrame, key: str):
+    """Genera /<centro>/Articulos.csv; devuelve (centro, nº artículos, ruta, cambió)."""
+    out_dir = ROOT / key
+    ensure_dir(out_dir)
+    out_path = out_dir / "Articulos.csv"
+
+    # columnas finales: solo las del export + stock de este centro (los stocks
+    # de los otros centros no entran); con Copy-on-Write la selección no copia
+    # datos y solo se reasignan CodigoEAN/ImagenURL/Stock
+    base_cols = [c for c in EXPORT_COLUMNS if c != "Stock"]
+    out = master[base_cols]
+    out["Stock"] = master[f"stock_{key}"]
+
+    # aplicar overrides (EAN/Imagen)
+    out = apply_overrides_per_center(out, key)
+
+    # guardar (; como separador) en .tmp y sustituir solo si el contenido cambia
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    out.to_csv(tmp_path, sep=";", index=False, encoding="utf-8")
+    changed = replace_if_changed(tmp_path, out_path)
+    return key, len(out), out_path, changed
+
+def build_state():
+    """(mtime, tamaño) de todo lo que interviene: imports, overrides, este script y salidas."""
+    paths = [IMPORTS["base_precios"], IMPORTS["stock"], Path(__file__).resolve()]
+    for key, _ in CENTERS.values():
+        paths += [*override_paths(key), ROOT / key / "Articulos.csv"]
+    state = {}
+    for p in paths:
+        st = p.stat() if p.exists() else None
+        state[str(p.relative_to(ROOT))] = [st.st_mtime_ns, st.st_size] if st else None
+    return state
+
+def build(verbose: bool = False, force: bool = False, use_cache: bool = True):
+    # build incremental: si nada ha cambiado desde el último build, no se hace nada
+    if not force and STATE_PATH.exists() and load_json_if_exists(STATE_PATH) == build_state():
+        if verbose:
+            log("→ Entradas y salidas sin cambios desde el último build (usa --force para regenerar)")
+        return
+
+    # base y stock son independientes: se leen a la vez (pyarrow/polars sueltan el GIL)
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_base = ex.submit(load_base_precios, IMPORTS["base_precios"], verbose, use_cache)
+        f_stock = ex.submit(load_stock, IMPORTS["stock"], verbose, use_cache)
+        base, stock = f_base.result(), f_stock.result()
 
     # merge base + stock
     master = base.merge(stock, on="NumeroArticulo", how="left")
 
-    # asegurar columnas de stock aun si no existen
+    # asegurar columnas de stock aun si no existen; los huecos del merge se
+    # rellenan una sola vez aquí y no en cada centro
     for cod, (key, _) in CENTERS.items():
         col = f"stock_{key}"
         if col not in master.columns:
             master[col] = 0
+        master[col] = to_int32(master[col].fillna(0))
 
     if verbose:
         log(f"→ Master total artículos: {len(master):,}")
 
-    # export por centro
-    for cod, (key, label) in CENTERS.items():
-        out_dir = ROOT / key
-        ensure_dir(out_dir)
-        out_path = out_dir / "Articulos.csv"
-
-        dfc = master.copy()
-        dfc["Stock"] = dfc[f"stock_{key}"].fillna(0).astype(int)
-
-        # columnas finales
-        out = dfc.reindex(columns=[
-            "NumeroArticulo",
-            "ReferenciaProveedor",
-            "Descripcion",
-            "CodigoEAN",
-            "NombreProveedor",
-            "ImagenURL",
-            "Precio",
-            "Stock",
-        ])
-
-        # aplicar overrides (EAN/Imagen)
-        out = apply_overrides_per_center(out, key)
-
-        # guardar (; como separador)
-        out.to_csv(out_path, sep=";", index=False, encoding="utf-8")
+    # export por centro: cada centro es independiente (master solo se lee),
+    # así que se escriben en paralelo; el log sale en el orden de CENTERS
+    with ThreadPoolExecutor(max_workers=len(CENTERS)) as ex:
+        results = list(ex.map(lambda key: export_center(master, key), [k for k, _ in CENTERS.values()]))
 
-        if verbose:
-            log(f"   · [{key}] {len(out):,} artículos -> {out_path.relative_to(ROOT)}")
+    if verbose:
+        for key, n, out_path, changed in results:
+            note = "" if changed else " (sin cambios)"
+            log(f"   · [{key}] {n:,} artículos -> {out_path.relative_to(ROOT)}{note}")
+
+    ensure_dir(CACHE_DIR)
+    STATE_PATH.write_text(json.dumps(build_state(), indent=1), encoding="utf-8")
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--verbose", action="store_true")
+    ap.add_argument("--force", action="store_true", help="regenerar aunque no haya cambios")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="no usar ni escribir la caché Parquet (p. ej. en CI, donde .cache/ no persiste)")
     args = ap.parse_args()
     if args.verbose:
         log("▶ Iniciando build_data.py")
@@ -297,7 +544,7 @@ def main():
         if not v.exists():
             raise SystemExit(f"ERROR: No existe {v}")
 
-    build(verbose=args.verbose)
+    build(verbose=args.verbose, force=args.force, use_cache=not args.no_cache)
 
     if args.verbose:
         log("✅ Finalizado")
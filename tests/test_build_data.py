@@ -0,0 +1,249 @@
+import importlib.util
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "build_data.py"
+spec = importlib.util.spec_from_file_location("build_data", SCRIPT)
+bd = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bd)
+
+# lector con y sin pyarrow: la salida no debe depender de lo instalado
+READERS = [False] + ([True] if bd.HAS_PYARROW else [])
+
+
+@pytest.fixture(params=READERS, ids=lambda v: "pyarrow" if v else "c")
+def reader(request, monkeypatch):
+    monkeypatch.setattr(bd, "HAS_PYARROW", request.param)
+    monkeypatch.setattr(bd, "TEXT_DTYPE", "string[pyarrow]" if request.param else str)
+    return request.param
+
+
+def test_numeric_override_ean_written_as_text(tmp_path, monkeypatch):
+    (tmp_path / "overrides" / "ean").mkdir(parents=True)
+    (tmp_path / "overrides" / "ean" / "coll.json").write_text('{"1000": 8410000000001, "1001": ""}', encoding="utf-8")
+    monkeypatch.setattr(bd, "ROOT", tmp_path)
+    df = pd.DataFrame({"NumeroArticulo": ["1000", "1001"], "CodigoEAN": ["", "123"], "ImagenURL": ["", ""]})
+    out = bd.apply_overrides_per_center(df, "coll")
+    assert out["CodigoEAN"].tolist() == ["8410000000001", "123"]
+
+
+def test_read_csv_smart_keeps_text(reader, tmp_path):
+    path = tmp_path / "stock.csv"
+    path.write_text(
+        "Articulo;Almacen;Existencias;Otra\n"
+        "0012345678905;1;1.000;x\n"
+        "7;2;2,5;\n"
+        ";3;NA;y\n",
+        encoding="utf-8",
+    )
+    df = bd.read_csv_smart(path, wanted=bd.ALIAS_STOCK)
+    assert list(df.columns) == ["Articulo", "Almacen", "Existencias"]
+    assert df["Articulo"].tolist()[:2] == ["0012345678905", "7"] and pd.isna(df["Articulo"][2])
+    assert df["Existencias"].tolist() == ["1.000", "2,5", "NA"]
+    assert bd.to_numeric(df["Existencias"]).tolist()[:2] == [1000.0, 2.5]
+
+
+@pytest.mark.parametrize("enc", ["utf-16-le", "utf-16-be"])
+def test_sniff_csv_utf16_bom(enc):
+    head = "\ufeffArticulo,Almacen,Existencias\n1,1,2;5\n".encode(enc)
+    assert bd.sniff_csv(head) == (",", "utf-16")
+
+
+def test_sniff_csv_utf8_and_latin1():
+    assert bd.sniff_csv("Almacén;1\n".encode("utf-8")) == (";", "utf-8-sig")
+    assert bd.sniff_csv("Almacén;1\n".encode("latin1")) == (";", "latin1")
+
+
+def test_read_csv_smart_utf16(reader, tmp_path):
+    path = tmp_path / "stock.csv"
+    path.write_text("Articulo,Almacen,Existencias\n0012,1,3\n", encoding="utf-16")
+    df = bd.read_csv_smart(path)
+    assert df["Articulo"].tolist() == ["0012"]
+
+
+# agregación de stock con y sin Polars: mismas filas y mismos tipos
+STOCK_ENGINES = [False] + ([True] if bd.HAS_POLARS else [])
+
+
+@pytest.mark.parametrize("polars", STOCK_ENGINES, ids=lambda v: "polars" if v else "pandas")
+def test_load_stock_same_with_and_without_polars(reader, polars, tmp_path, monkeypatch):
+    path = tmp_path / "stock.csv"
+    path.write_text(
+        "Articulo;Almacen;Existencias\n"
+        "0012;1;3\n"
+        "0012;1;1,6\n"
+        "0012;3;2\n"
+        "7;2;1.000\n"
+        ";1;7\n"       # sin artículo: no debe llegar al merge
+        " ;2;5\n"
+        "8;9;4\n"      # almacén fuera de CENTERS
+        "9;1;3e9\n",   # fuera de int32: se recorta, no da la vuelta
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(bd, "HAS_POLARS", polars)
+    got = bd.load_stock(path, verbose=False, use_cache=False)
+    got = got.sort_values("NumeroArticulo", ignore_index=True)
+
+    monkeypatch.setattr(bd, "HAS_POLARS", False)
+    ref = bd.load_stock(path, verbose=False, use_cache=False)
+    ref = ref.sort_values("NumeroArticulo", ignore_index=True)
+    pd.testing.assert_frame_equal(got, ref)
+
+    assert got["NumeroArticulo"].tolist() == ["0012", "7", "9"]
+    row = got.set_index("NumeroArticulo")
+    assert row.loc["0012", "stock_coll"] == 5 and row.loc["0012", "stock_alcudia"] == 2
+    assert row.loc["7", "stock_calvia"] == 1000
+    assert row.loc["9", "stock_coll"] == bd.INT32_MAX
+    assert all(got[c].dtype == "int32" for c in got.columns if c.startswith("stock_"))
+
+
+def test_to_int32_clips_out_of_range():
+    s = pd.Series([3e9, -3e9, 2.5, 3.5, 0.0])
+    assert bd.to_int32(s).tolist() == [bd.INT32_MAX, bd.INT32_MIN, 2, 4, 0]
+
+
+def test_replace_if_changed_keeps_unchanged_file(tmp_path):
+    path, tmp = tmp_path / "Articulos.csv", tmp_path / "Articulos.csv.tmp"
+    path.write_text("a;b\n1;2\n", encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+
+    tmp.write_text("a;b\n1;2\n", encoding="utf-8")
+    assert bd.replace_if_changed(tmp, path) is False
+    assert not tmp.exists() and path.stat().st_mtime_ns == 1
+
+    tmp.write_text("a;b\n1;3\n", encoding="utf-8")
+    assert bd.replace_if_changed(tmp, path) is True
+    assert not tmp.exists() and path.read_text(encoding="utf-8") == "a;b\n1;3\n"
+
+
+def test_resolve_columns_rank_and_ties():
+    # gana el alias que va antes en MAP_BASE, da igual el orden de las columnas
+    assert bd.resolve_columns(["Precio", "PVP"], bd.ALIAS_BASE)["precio"] == "PVP"
+    assert bd.resolve_columns(["PVP", "Precio"], bd.ALIAS_BASE)["precio"] == "PVP"
+    # mismo alias con distinto caso: gana la última columna, como el dict {c.lower(): c} de antes
+    assert bd.resolve_columns(["pvp", "PVP"], bd.ALIAS_BASE)["precio"] == "PVP"
+    assert bd.resolve_columns(["Otra"], bd.ALIAS_BASE) == {}
+
+
+def test_load_json_if_exists_rereads_changed_file(tmp_path):
+    path = tmp_path / "coll.json"
+    path.write_text('{"1": "A"}', encoding="utf-8")
+    assert bd.load_json_if_exists(path) == {"1": "A"}
+    path.write_text('{"1": "B", "2": "C"}', encoding="utf-8")
+    assert bd.load_json_if_exists(path) == {"1": "B", "2": "C"}
+    assert bd.load_json_if_exists(tmp_path / "no-existe.json") == {}
+
+
+@pytest.mark.skipif(not bd.HAS_PYARROW, reason="la caché Parquet necesita pyarrow")
+def test_read_csv_cached_key_and_no_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(bd, "CACHE_DIR", tmp_path / ".cache")
+    path = tmp_path / "stock.csv"
+    path.write_text("Articulo;Almacen;Existencias\n0012;1;3\n", encoding="utf-8")
+
+    bd.read_csv_cached(path, wanted=bd.ALIAS_STOCK, use_cache=False)
+    assert not (tmp_path / ".cache").exists()
+
+    bd.read_csv_cached(path, wanted=bd.ALIAS_STOCK)
+    [cached] = (tmp_path / ".cache").glob("stock-*.parquet")
+    assert bd.read_csv_cached(path, wanted=bd.ALIAS_STOCK)["Articulo"].tolist() == ["0012"]
+
+    # otro script/versiones -> otra clave: el Parquet anterior no se reutiliza
+    monkeypatch.setattr(bd, "cache_salt", lambda: "otra-version")
+    bd.read_csv_cached(path, wanted=bd.ALIAS_STOCK)
+    [renewed] = (tmp_path / ".cache").glob("stock-*.parquet")
+    assert renewed != cached
+
+
+def test_base_keys_keep_leading_zeros_for_overrides(reader, tmp_path, monkeypatch):
+    path = tmp_path / "base.csv"
+    path.write_text(
+        "NumeroArticulo;ReferenciaProveedor;Descripcion;PVP;CodigoEAN\n"
+        "00123;R1;Uno;1,5;0840000000001\n"
+        "124;R2;Dos;2;\n",
+        encoding="utf-8",
+    )
+    base = bd.load_base_precios(path, verbose=False, use_cache=False)
+    for c in ["NumeroArticulo", "ReferenciaProveedor", "CodigoEAN"]:
+        assert base[c].dtype == pd.api.types.pandas_dtype(bd.TEXT_DTYPE)
+    assert base["NumeroArticulo"].tolist() == ["00123", "124"]
+    assert base["CodigoEAN"].iloc[0] == "0840000000001"
+
+    (tmp_path / "overrides" / "ean").mkdir(parents=True)
+    (tmp_path / "overrides" / "ean" / "coll.json").write_text('{"00123": "EAN-OVR"}', encoding="utf-8")
+    monkeypatch.setattr(bd, "ROOT", tmp_path)
+    out = bd.apply_overrides_per_center(base, "coll")
+    assert out["CodigoEAN"].tolist()[0] == "EAN-OVR"
+
+
+@pytest.mark.parametrize("head, sep", [
+    (b"a;b;c\n1,5;2,5;3,5\n4,0;5,0;6,0\n", ";"),
+    (b"Articulo;Descripcion;PVP\n1;Tornillo 3,5 mm, caja;1,25\n2;Taco;0,10\n", ";"),
+    (b"a,b,c\n1.5,2.5,3.5\n", ","),
+    (b"a\tb\n1,5\t2,5\n", "\t"),
+])
+def test_sniff_sep_decimal_commas(head, sep):
+    assert bd.sniff_sep(head) == sep
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    """Árbol mínimo (imports, overrides, script) con build_data apuntando a él."""
+    (tmp_path / "imports").mkdir()
+    (tmp_path / "imports" / "base_articulos.csv").write_text(
+        "NumeroArticulo;ReferenciaProveedor;Descripcion;PVP\n0012;R1;Uno;1,5\n7;R2;Dos;2\n",
+        encoding="utf-8",
+    )
+    (tmp_path / "imports" / "stock_por_almacen.csv").write_text(
+        "Articulo;Almacen;Existencias\n0012;1;3\n7;2;4\n", encoding="utf-8",
+    )
+    (tmp_path / "overrides" / "ean").mkdir(parents=True)
+    script = tmp_path / "scripts" / "build_data.py"
+    script.parent.mkdir()
+    script.write_bytes(SCRIPT.read_bytes())
+
+    monkeypatch.setattr(bd, "__file__", str(script))
+    monkeypatch.setattr(bd, "ROOT", tmp_path)
+    monkeypatch.setattr(bd, "IMPORTS", {
+        "base_precios": tmp_path / "imports" / "base_articulos.csv",
+        "stock": tmp_path / "imports" / "stock_por_almacen.csv",
+    })
+    monkeypatch.setattr(bd, "CACHE_DIR", tmp_path / ".cache")
+    monkeypatch.setattr(bd, "STATE_PATH", tmp_path / ".cache" / "build_data.json")
+    return tmp_path
+
+
+def _build(capsys):
+    bd.build(verbose=True)
+    return "sin cambios desde el último build" not in capsys.readouterr().out
+
+
+def test_build_skips_when_nothing_changed(project, capsys):
+    assert _build(capsys)
+    assert (project / "coll" / "Articulos.csv").read_text(encoding="utf-8").splitlines()[1] == \
+        "0012;R1;Uno;;;;1.5;3"
+    assert not _build(capsys)
+
+
+@pytest.mark.parametrize("touched", ["imports/stock_por_almacen.csv", "overrides/ean/coll.json"])
+def test_build_reruns_when_input_changes(project, capsys, touched):
+    override = project / "overrides" / "ean" / "coll.json"
+    override.write_text('{"0012": "8410000000001"}', encoding="utf-8")
+    assert _build(capsys)
+    outputs = {key: project / key / "Articulos.csv" for key, _ in bd.CENTERS.values()}
+    for out in outputs.values():
+        os.utime(out, ns=(1, 1))
+    before = bd.build_state()  # ya con las mtimes de salida retocadas
+    bd.STATE_PATH.write_text(json.dumps(before), encoding="utf-8")
+    assert not _build(capsys)
+
+    # mismo contenido, mtime nueva: se reconstruye, pero las salidas iguales no se reescriben
+    path = project / touched
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert _build(capsys)
+    assert all(out.stat().st_mtime_ns == 1 for out in outputs.values())
+    assert "8410000000001" in outputs["coll"].read_text(encoding="utf-8")